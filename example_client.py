@@ -7,11 +7,12 @@ Wireshark MCP客户端示例
 """
 
 import asyncio
-import json
 import time
 import sys
 from typing import Dict, Any
 
+import orjson
+
 from mcp.client.client import Client
 from mcp.client.transport import ClientTransport
 from mcp.client.sse import SseClientTransport
@@ -24,7 +25,7 @@ async def print_response(result: Any) -> None:
     if not result:
         return
     
-    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
 async def main() -> None:
     """主函数"""
@@ -7,129 +7,573 @@ Wireshark MCP服务器
 """
 
 import os
+import re
 import sys
+import asyncio
+import glob
+import shutil
+import tempfile
+import weakref
+import zlib
 import subprocess
 import json
-import pyshark
+import orjson
 import time
-from typing import Dict, List, Optional, Any
+from pathlib import Path
+from types import MappingProxyType
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Any, Tuple
 import logging
-from contextlib import asynccontextmanager
-from typing import AsyncIterator
+from collections import OrderedDict
+from contextlib import asynccontextmanager, closing
+from typing import AsyncIterator, Iterator
 from starlette.applications import Starlette
 from starlette.routing import Mount, Route
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse, HTMLResponse
+from starlette.responses import HTMLResponse, Response
 
 # 修改导入语句，使用新版本MCP
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.types import TextContent
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("WiresharkMCPServer")
 
+# tshark安装状态和接口列表的缓存 (时间戳, 结果)，避免每次调用都启动tshark进程
+_INSTALL_CACHE_TTL = 300
+_IFACE_CACHE_TTL = 30
+_install_cache: Optional[Tuple[float, bool]] = None
+_iface_cache: Optional[Tuple[float, List[Dict[str, str]]]] = None
+
+# tshark -D 输出行，如 "1. en0 (Wi-Fi)"
+_IFACE_RE = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$")
+
+# 提示文本，同时供提示存储和@app.prompt()指南使用
+_FILTERS_TEXT = (
+    "常用Wireshark过滤器:\n"
+    "- IP地址过滤: ip.addr == 192.168.1.1\n"
+    "- 端口过滤: tcp.port == 80 或 udp.port == 53\n"
+    "- 协议过滤: http 或 dns 或 tcp\n"
+    "- HTTP请求过滤: http.request.method == \"GET\"\n"
+    "- DNS过滤: dns.qry.name contains \"example.com\"\n"
+    "- 数据包大小过滤: frame.len > 1000\n"
+    "- 多条件组合: (ip.src == 192.168.1.1) && (tcp.port == 80)\n"
+)
+
+_ANALYSIS_TEXT = (
+    "网络分析基本步骤:\n"
+    "1. 应用适当的过滤器缩小分析范围\n"
+    "2. 查找关键连接 (SYN, SYN-ACK等TCP握手)\n"
+    "3. 分析响应时间和延迟情况\n"
+    "4. 检查错误包和重传包\n"
+    "5. 对特定协议深入分析其字段\n"
+    "6. 导出重要会话为单独文件\n"
+)
+
+_COMMANDS_TEXT = (
+    "有用的Wireshark命令行命令:\n"
+    "- 捕获数据包: tshark -i <interface> -w <output.pcap>\n"
+    "- 读取捕获文件: tshark -r <input.pcap>\n"
+    "- 应用过滤器: tshark -r <input.pcap> -Y \"<display filter>\"\n"
+    "- 提取特定字段: tshark -r <input.pcap> -T fields -e <field>\n"
+    "- 统计信息: tshark -r <input.pcap> -q -z <statistics>\n"
+)
+
 class WiresharkPromptStore:
     """Wireshark相关提示的存储类"""
     
     def __init__(self):
-        """初始化提示存储"""
-        self._prompts = {
-            "wireshark_filters": {
+        """初始化提示存储，提示内容只读，列表在初始化时生成一次"""
+        self._prompts = MappingProxyType({
+            "wireshark_filters": MappingProxyType({
                 "id": "wireshark_filters",
-                "text": (
-                    "常用Wireshark过滤器:\n"
-                    "- IP地址过滤: ip.addr == 192.168.1.1\n"
-                    "- 端口过滤: tcp.port == 80 或 udp.port == 53\n"
-                    "- 协议过滤: http 或 dns 或 tcp\n"
-                    "- HTTP请求过滤: http.request.method == \"GET\"\n"
-                    "- DNS过滤: dns.qry.name contains \"example.com\"\n"
-                    "- 数据包大小过滤: frame.len > 1000\n"
-                    "- 多条件组合: (ip.src == 192.168.1.1) && (tcp.port == 80)\n"
-                )
-            },
-            "wireshark_analysis": {
+                "text": _FILTERS_TEXT
+            }),
+            "wireshark_analysis": MappingProxyType({
                 "id": "wireshark_analysis",
-                "text": (
-                    "网络分析基本步骤:\n"
-                    "1. 应用适当的过滤器缩小分析范围\n"
-                    "2. 查找关键连接 (SYN, SYN-ACK等TCP握手)\n"
-                    "3. 分析响应时间和延迟情况\n"
-                    "4. 检查错误包和重传包\n"
-                    "5. 对特定协议深入分析其字段\n"
-                    "6. 导出重要会话为单独文件\n"
-                )
-            },
-            "wireshark_commands": {
+                "text": _ANALYSIS_TEXT
+            }),
+            "wireshark_commands": MappingProxyType({
                 "id": "wireshark_commands",
-                "text": (
-                    "有用的Wireshark命令行命令:\n"
-                    "- 捕获数据包: tshark -i <interface> -w <output.pcap>\n"
-                    "- 读取捕获文件: tshark -r <input.pcap>\n"
-                    "- 应用过滤器: tshark -r <input.pcap> -Y \"<display filter>\"\n"
-                    "- 提取特定字段: tshark -r <input.pcap> -T fields -e <field>\n"
-                    "- 统计信息: tshark -r <input.pcap> -q -z <statistics>\n"
-                )
-            }
-        }
+                "text": _COMMANDS_TEXT
+            })
+        })
+        self._prompts_list = tuple(self._prompts.values())
+        # 提示内容固定不变，预先序列化wireshark_get_prompts的响应
+        self._prompts_json = orjson.dumps({"prompts": [dict(prompt) for prompt in self._prompts_list]})
 
-    def get(self, prompt_id: str) -> Optional[Dict[str, str]]:
+    def get(self, prompt_id: str) -> Optional[Mapping[str, str]]:
         """获取特定ID的提示"""
         return self._prompts.get(prompt_id)
     
-    def list(self) -> List[Dict[str, str]]:
+    def list(self) -> Tuple[Mapping[str, str], ...]:
         """列出所有提示"""
-        return list(self._prompts.values())
+        return self._prompts_list
+    
+    def list_bytes(self) -> bytes:
+        """列出所有提示，返回预先序列化的JSON"""
+        return self._prompts_json
+
+# 单行输出的最大长度，-T ek模式下一个数据包就是一行JSON
+_STREAM_LINE_LIMIT = 16 * 1024 * 1024
+# 统计分析输出的默认上限，超出后截断并结束tshark
+_MAX_OUTPUT_BYTES = 1024 * 1024
+# 读取数据包时每解析多少个包上报一次进度
+_PROGRESS_INTERVAL = 100
+
+async def _run_command(cmd: List[str]) -> Tuple[int, str, str]:
+    """异步运行命令，不阻塞事件循环，返回 (退出码, stdout, stderr)"""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await proc.communicate()
+    return (
+        proc.returncode,
+        stdout.decode(errors="replace"),
+        stderr.decode(errors="replace")
+    )
+
+async def _run_command_capped(cmd: List[str], max_bytes: Optional[int] = None) -> Tuple[int, str, str, bool]:
+    """异步逐行读取命令输出，超过max_bytes时截断并结束进程，返回 (退出码, stdout, stderr, 是否截断)"""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=_STREAM_LINE_LIMIT
+    )
+    stderr_task = asyncio.create_task(proc.stderr.read())
+    buf = bytearray()
+    truncated = False
+    finished = False
+    try:
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                finished = True
+                break
+            buf.extend(line)
+            if max_bytes and len(buf) >= max_bytes:
+                truncated = True
+                break
+    finally:
+        if not finished and proc.returncode is None:
+            proc.terminate()
+        returncode = await proc.wait()
+        stderr = await stderr_task
+    
+    if truncated:
+        del buf[max_bytes:]
+    return (
+        returncode,
+        buf.decode(errors="replace"),
+        stderr.decode(errors="replace"),
+        truncated
+    )
+
+class TsharkLimiter:
+    """tshark并发限制器，限制同时运行的读取/分析进程数量 (可用 async with 占用一个名额)"""
+    
+    def __init__(self, size: int = 4):
+        """初始化限制器"""
+        self.size = max(1, size)
+        self._semaphore = asyncio.Semaphore(self.size)
+    
+    async def __aenter__(self) -> "TsharkLimiter":
+        await self._semaphore.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._semaphore.release()
+    
+    async def run(self, cmd: List[str], max_bytes: Optional[int] = None) -> Tuple[int, str, str, bool]:
+        """占用一个名额运行tshark命令，输出超过max_bytes时截断"""
+        async with self:
+            return await _run_command_capped(cmd, max_bytes)
+
+# 读取和分析请求共享的tshark并发限制
+tshark_limiter = TsharkLimiter(int(os.environ.get("MCP_TSHARK_WORKERS", 4)))
+
+# 支持的分析类型及对应的tshark -z统计参数
+_ANALYSIS_TYPES = {
+    "conversations": "conv,ip",
+    "endpoints": "endpoints,ip",
+    "protocols": "io,phs",
+    "http": "http,tree",
+    "dns": "dns,tree"
+}
+
+# 超过该大小的捕获文件会被editcap拆分后并行分析
+_SHARD_MIN_BYTES = 64 * 1024 * 1024
+
+# io,phs 输出行，如 "    tcp    frames:10 bytes:700"
+_PHS_LINE_RE = re.compile(r"^(\s*)(\S+)\s+frames:(\d+)\s+bytes:(\d+)\s*$")
+
+# 每个捕获文件一把锁，同一文件同时只保留一份分片副本；无人持有时自动回收
+_shard_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _merge_phs(outputs: List[str]) -> str:
+    """合并多个分片的协议分层统计，按协议路径累加frames和bytes"""
+    root: Dict[str, Any] = {"children": {}}
+    header: List[str] = []
+    for index, output in enumerate(outputs):
+        stack = [root]
+        for line in output.splitlines():
+            m = _PHS_LINE_RE.match(line)
+            if not m:
+                # 表头取第一个分片在统计行之前的部分
+                if index == 0 and len(stack) == 1 and not root["children"]:
+                    header.append(line)
+                continue
+            depth = len(m.group(1)) // 2
+            del stack[depth + 1:]
+            node = stack[-1]["children"].setdefault(
+                m.group(2), {"frames": 0, "bytes": 0, "children": {}}
+            )
+            node["frames"] += int(m.group(3))
+            node["bytes"] += int(m.group(4))
+            stack.append(node)
+    
+    lines = list(header)
+    def emit(node: Dict[str, Any], depth: int) -> None:
+        for name, child in node["children"].items():
+            label = "  " * depth + name
+            lines.append(f"{label:<40} frames:{child['frames']} bytes:{child['bytes']}")
+            emit(child, depth + 1)
+    emit(root, 0)
+    lines.extend(line for line in header[:2] if line.startswith("="))
+    return "\n".join(lines) + "\n"
+
+# 可以按分片合并结果的分析类型；其余类型（会话/端点的字节列带单位且有相对时间，
+# http/dns树统计含比例）无法精确合并，仍然单进程分析
+_SHARD_MERGERS = {
+    "protocols": _merge_phs
+}
+
+async def _split_capture(path: str, shards: int, shard_dir: str) -> List[str]:
+    """用editcap把捕获文件拆分为若干分片，写入shard_dir"""
+    returncode, stdout, stderr = await _run_command(["capinfos", "-T", "-r", "-c", path])
+    if returncode != 0:
+        raise OSError(f"capinfos执行失败: {stderr.strip()}")
+    packet_count = int(stdout.strip().split("\t")[-1])
+    per_shard = max(1, -(-packet_count // shards))
+    
+    _, ext = os.path.splitext(path)
+    returncode, _, stderr = await _run_command(
+        ["editcap", "-c", str(per_shard), path, os.path.join(shard_dir, "shard" + ext)]
+    )
+    if returncode != 0:
+        raise OSError(f"editcap执行失败: {stderr.strip()}")
+    
+    return sorted(glob.glob(os.path.join(shard_dir, "shard*")))
+
+async def _sharded_analyze(file_path: str, analysis_type: str, shards: int) -> Dict[str, Any]:
+    """拆分捕获文件，并行对每个分片运行tshark -z，再合并统计结果；分片用完即删除"""
+    path = os.path.abspath(file_path)
+    lock = _shard_locks.get(path)
+    if lock is None:
+        lock = _shard_locks[path] = asyncio.Lock()
+    
+    async with lock:
+        # 分片总大小与原文件相当，默认放在捕获文件旁边而不是/tmp（常为tmpfs，占用内存）
+        shard_root = os.environ.get("MCP_SHARD_DIR") or os.path.dirname(path)
+        shard_dir = tempfile.mkdtemp(prefix="wireshark_mcp_shards_", dir=shard_root)
+        try:
+            shard_files = await _split_capture(path, shards, shard_dir)
+            results = await asyncio.gather(*[
+                tshark_limiter.run(["tshark", "-r", shard, "-q", "-z", _ANALYSIS_TYPES[analysis_type]])
+                for shard in shard_files
+            ])
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+    
+    failed = [r for r in results if r[0] != 0]
+    if failed:
+        return {
+            "success": False,
+            "stdout": "",
+            "stderr": failed[0][2],
+            "truncated": False
+        }
+    
+    return {
+        "success": True,
+        "stdout": _SHARD_MERGERS[analysis_type]([r[1] for r in results]),
+        "stderr": "".join(r[2] for r in results),
+        "truncated": False,
+        "shards": len(shard_files)
+    }
+
+# 各统计类型输出段落的标题，用于拆分一次tshark运行中多个-z的输出
+_ANALYSIS_TITLES = {
+    "conversations": "IPv4 Conversations",
+    "endpoints": "IPv4 Endpoints",
+    "protocols": "Protocol Hierarchy Statistics",
+    "http": "HTTP/Packet Counter",
+    "dns": "DNS"
+}
+
+def _split_stat_sections(output: str) -> Dict[str, str]:
+    """拆分多个-z统计的输出，返回 分析类型 -> 段落文本（按出现顺序）
+    
+    段落从"==="分隔线加已知标题处开始（包括其前面的空行，stats_tree和io,phs的输出以空行开头），
+    到下一个段落开始或输出结束为止，原样保留结尾的分隔线，与单独运行时的输出一致。
+    """
+    lines = output.splitlines(keepends=True)
+    starts: List[Tuple[int, str]] = []
+    for i, line in enumerate(lines):
+        if not (line.startswith("===") and not line.strip().strip("=")):
+            continue
+        title = next((l.strip() for l in lines[i + 1:] if l.strip()), "")
+        for analysis_type, prefix in _ANALYSIS_TITLES.items():
+            if title.startswith(prefix):
+                start = i
+                while start > 0 and not lines[start - 1].strip():
+                    start -= 1
+                starts.append((start, analysis_type))
+                break
+    
+    sections = {}
+    for n, (start, analysis_type) in enumerate(starts):
+        end = starts[n + 1][0] if n + 1 < len(starts) else len(lines)
+        if analysis_type not in sections:
+            sections[analysis_type] = "".join(lines[start:end])
+    return sections
+
+def _truncate_utf8(text: str, max_bytes: Optional[int]) -> Tuple[str, bool]:
+    """按UTF-8字节数截断文本"""
+    data = text.encode()
+    if not max_bytes or len(data) <= max_bytes:
+        return text, False
+    return data[:max_bytes].decode(errors="ignore"), True
+
+class _AnalyzeBatcher:
+    """合并同一捕获文件上并发的分析请求，用一次带多个-z的tshark运行完成"""
+    
+    def __init__(self, delay: float = 0.05):
+        """初始化合并器，delay为等待同文件其他请求的时间窗口（秒）"""
+        self._delay = delay
+        self._pending: Dict[str, List[Tuple[str, Optional[int], asyncio.Future]]] = {}
+        # 持有刷新任务的引用，防止任务在完成前被回收
+        self._tasks: set = set()
+    
+    async def submit(self, file_path: str, analysis_type: str, max_bytes: Optional[int] = None) -> Tuple[int, str, str, bool]:
+        """提交分析请求，返回 (退出码, stdout, stderr, 是否截断)"""
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.get(file_path)
+        if batch is None:
+            batch = self._pending[file_path] = []
+            task = asyncio.create_task(self._flush_later(file_path))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        batch.append((analysis_type, max_bytes, future))
+        return await future
+    
+    async def _flush_later(self, file_path: str) -> None:
+        """等待时间窗口结束后执行该文件积累的所有请求"""
+        await asyncio.sleep(self._delay)
+        batch = self._pending.pop(file_path)
+        try:
+            results = await self._run_batch(file_path, batch)
+            for (analysis_type, _, future) in batch:
+                if not future.done():
+                    future.set_result(results[analysis_type])
+        except Exception as e:
+            for (_, _, future) in batch:
+                if not future.done():
+                    future.set_exception(e)
+    
+    async def _run_batch(self, file_path: str, batch: List[Tuple[str, Optional[int], asyncio.Future]]) -> Dict[str, Tuple[int, str, str, bool]]:
+        """对一批请求运行tshark，并把输出拆分给各分析类型"""
+        limits: Dict[str, Optional[int]] = {}
+        for analysis_type, max_bytes, _ in batch:
+            # 同一类型的多个请求取最宽松的上限
+            current = limits.get(analysis_type, 0)
+            limits[analysis_type] = None if current is None or not max_bytes else max(current, max_bytes)
+        
+        if len(limits) == 1:
+            analysis_type, max_bytes = next(iter(limits.items()))
+            cmd = ["tshark", "-r", file_path, "-q", "-z", _ANALYSIS_TYPES[analysis_type]]
+            return {analysis_type: await tshark_limiter.run(cmd, max_bytes)}
+        
+        cmd = ["tshark", "-r", file_path, "-q"]
+        for analysis_type in limits:
+            cmd.extend(["-z", _ANALYSIS_TYPES[analysis_type]])
+        total_bytes = None if None in limits.values() else sum(limits.values())
+        returncode, stdout, stderr, combined_truncated = await tshark_limiter.run(cmd, total_bytes)
+        sections = _split_stat_sections(stdout) if combined_truncated or returncode == 0 else {}
+        if combined_truncated and sections:
+            # 输出被截断时最后一个段落可能不完整
+            sections.pop(list(sections)[-1])
+        
+        results = {}
+        missing = []
+        for analysis_type, max_bytes in limits.items():
+            if analysis_type in sections:
+                text, truncated = _truncate_utf8(sections[analysis_type], max_bytes)
+                results[analysis_type] = (0, text, stderr, truncated)
+            else:
+                missing.append((analysis_type, max_bytes))
+        
+        # 输出无法识别或被截断的类型，各自单独运行
+        reruns = await asyncio.gather(*[
+            tshark_limiter.run(["tshark", "-r", file_path, "-q", "-z", _ANALYSIS_TYPES[analysis_type]], max_bytes)
+            for analysis_type, max_bytes in missing
+        ])
+        for (analysis_type, _), result in zip(missing, reruns):
+            results[analysis_type] = result
+        return results
+
+_analyze_batcher = _AnalyzeBatcher()
+
+class _AnalysisCache:
+    """分析结果的LRU缓存，键包含文件的mtime和大小，文件变化后自动失效"""
+    
+    # 超过该大小的stdout压缩后存储
+    COMPRESS_MIN_BYTES = 64 * 1024
+    
+    def __init__(self, maxsize: int = 128):
+        """初始化缓存"""
+        self._maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, int, int, str, Optional[int]], Dict[str, Any]]" = OrderedDict()
+    
+    @staticmethod
+    def key(file_path: str, analysis_type: str, max_bytes: Optional[int]) -> Optional[Tuple[str, int, int, str, Optional[int]]]:
+        """生成缓存键，文件不可访问时返回None"""
+        try:
+            path = os.path.abspath(file_path)
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (path, st.st_mtime_ns, st.st_size, analysis_type, max_bytes)
+    
+    def get(self, key: Tuple[str, int, int, str, Optional[int]]) -> Optional[Dict[str, Any]]:
+        """读取缓存结果"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        result = dict(entry)
+        if isinstance(result["stdout"], bytes):
+            result["stdout"] = zlib.decompress(result["stdout"]).decode()
+        return result
+    
+    def put(self, key: Tuple[str, int, int, str, Optional[int]], result: Dict[str, Any]) -> None:
+        """写入缓存结果，超出容量时淘汰最久未使用的条目"""
+        entry = dict(result)
+        stdout = entry["stdout"].encode()
+        if len(stdout) >= self.COMPRESS_MIN_BYTES:
+            entry["stdout"] = zlib.compress(stdout)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+_analysis_cache = _AnalysisCache()
+
+def _iter_json_packets(file_path: str, protocols: Optional[List[str]] = None, filter_str: str = None) -> Iterator[Dict[str, Any]]:
+    """用pyshark的JSON模式逐个解析数据包，不保留Packet对象"""
+    # 延迟导入pyshark，避免服务器启动时的额外开销
+    import pyshark
+    
+    # pyshark解析每个包时都要读取frame层 (frame.len/frame.time_epoch等)，投影中必须保留frame
+    custom_parameters = None
+    if protocols:
+        custom_parameters = {"-j": " ".join(["frame", *(protocol for protocol in protocols if protocol != "frame")])}
+    cap = pyshark.FileCapture(
+        file_path,
+        display_filter=filter_str,
+        use_json=True,
+        include_raw=False,
+        keep_packets=False,
+        custom_parameters=custom_parameters
+    )
+    try:
+        for packet in cap:
+            yield {
+                "number": packet.number,
+                "timestamp": packet.sniff_timestamp,
+                "length": packet.length,
+                # 投影后可能没有任何协议层，此时packet.highest_layer会抛出IndexError
+                "highest_layer": packet.layers[-1].layer_name.upper() if packet.layers else None,
+                "layers": {
+                    layer.layer_name: {
+                        name: str(layer.get_field(name)) for name in layer.field_names
+                    }
+                    for layer in packet.layers
+                }
+            }
+    finally:
+        cap.close()
+
+def _parse_with_pyshark(file_path: str, protocols: Optional[List[str]], filter_str: str, limit: int) -> List[Dict[str, Any]]:
+    """收集最多limit个pyshark解析结果 (在线程中运行，pyshark自带事件循环)"""
+    packets = []
+    # 提前退出时显式关闭生成器，确保tshark进程立即结束，而不是等到生成器被回收
+    with closing(_iter_json_packets(file_path, protocols, filter_str)) as packet_iter:
+        for packet in packet_iter:
+            packets.append(packet)
+            if limit and len(packets) >= limit:
+                break
+    return packets
 
 class WiresharkTools:
     """Wireshark工具类"""
     
     @staticmethod
-    def check_wireshark_installed() -> bool:
-        """检查Wireshark是否已安装"""
-        try:
-            # 检查tshark是否可用
-            subprocess.run(
-                ["tshark", "--version"], 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                check=True
-            )
-            return True
-        except (subprocess.SubprocessError, FileNotFoundError):
-            return False
+    async def check_wireshark_installed() -> bool:
+        """检查Wireshark是否已安装（结果缓存5分钟）"""
+        global _install_cache
+        now = time.monotonic()
+        if _install_cache is not None and now - _install_cache[0] < _INSTALL_CACHE_TTL:
+            return _install_cache[1]
+        
+        # 先用shutil.which快速检查，不在PATH中则无需启动进程
+        if shutil.which("tshark") is None:
+            installed = False
+        else:
+            try:
+                # 检查tshark是否可用
+                returncode, _, _ = await _run_command(["tshark", "--version"])
+                installed = returncode == 0
+            except (subprocess.SubprocessError, OSError):
+                installed = False
+        
+        _install_cache = (now, installed)
+        return installed
     
     @staticmethod
-    def get_available_interfaces() -> List[Dict[str, str]]:
-        """获取可用的网络接口列表"""
+    async def get_available_interfaces() -> List[Dict[str, str]]:
+        """获取可用的网络接口列表（结果缓存30秒）"""
+        global _iface_cache
+        now = time.monotonic()
+        if _iface_cache is not None and now - _iface_cache[0] < _IFACE_CACHE_TTL:
+            return list(_iface_cache[1])
+        
         try:
-            result = subprocess.run(
-                ["tshark", "-D"], 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                text=True, 
-                check=True
-            )
+            returncode, stdout, _ = await _run_command(["tshark", "-D"])
+            if returncode != 0:
+                return []
             
             interfaces = []
-            for line in result.stdout.strip().split('\n'):
-                if line:
-                    # 格式通常为: "1. en0 (Wi-Fi)"
-                    parts = line.split(' ', 1)
-                    if len(parts) > 1:
-                        index = parts[0].rstrip('.')
-                        description = parts[1]
-                        interfaces.append({
-                            "index": index,
-                            "interface": description
-                        })
+            for line in stdout.splitlines():
+                # 格式通常为: "1. en0 (Wi-Fi)"
+                m = _IFACE_RE.match(line)
+                if m:
+                    interfaces.append({
+                        "index": m.group(1),
+                        "interface": m.group(2)
+                    })
             
-            return interfaces
-        except subprocess.SubprocessError:
+            _iface_cache = (now, interfaces)
+            return list(interfaces)
+        except (subprocess.SubprocessError, OSError):
             return []
     
     @staticmethod
-    def capture_packets(interface: str, duration: int = 10, filter_str: str = None, output_file: str = None) -> Dict[str, Any]:
+    async def capture_packets(interface: str, duration: int = 10, filter_str: str = None, output_file: str = None) -> Dict[str, Any]:
         """捕获网络数据包"""
         try:
             cmd = ["tshark", "-i", interface, "-a", f"duration:{duration}"]
@@ -140,88 +584,166 @@ class WiresharkTools:
             if output_file:
                 cmd.extend(["-w", output_file])
             
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            returncode, stdout, stderr = await _run_command(cmd)
             
             return {
-                "success": result.returncode == 0,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
+                "success": returncode == 0,
+                "stdout": stdout,
+                "stderr": stderr,
                 "output_file": output_file if output_file else None
             }
-        except subprocess.SubprocessError as e:
+        except (subprocess.SubprocessError, OSError) as e:
             return {
                 "success": False,
                 "error": str(e)
             }
     
     @staticmethod
-    def read_capture_file(file_path: str, filter_str: str = None, limit: int = 100) -> Dict[str, Any]:
-        """读取捕获的数据包文件"""
+    async def read_capture_file(
+        file_path: str,
+        filter_str: str = None,
+        limit: int = 100,
+        protocols: Optional[List[str]] = None,
+        progress: Optional[Callable[[int, Optional[int]], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """读取捕获的数据包文件，以-T ek格式逐行解析为数据包列表，可通过progress回调上报进度"""
         try:
-            cmd = ["tshark", "-r", file_path]
+            cmd = ["tshark", "-r", file_path, "-T", "ek", "-n"]
             
             if filter_str:
                 cmd.extend(["-Y", filter_str])
             
-            if limit:
-                cmd.extend(["-c", str(limit)])
+            # 只输出指定协议的字段，未指定时保留完整解析结果
+            if protocols:
+                protocol_list = " ".join(protocols)
+                cmd.extend(["-j", protocol_list, "-J", protocol_list])
             
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            packets = []
+            truncated = False
+            # 进度通知在后台发送，同一时间最多一个在途，避免等待客户端时占用tshark名额
+            progress_task: Optional[asyncio.Task] = None
+            async with tshark_limiter:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    limit=_STREAM_LINE_LIMIT
+                )
+                stderr_task = asyncio.create_task(proc.stderr.read())
+                finished = False
+                try:
+                    async for line in proc.stdout:
+                        # ek格式中每个数据包前有一行索引信息，跳过
+                        if not line.strip() or line.startswith(b'{"index"'):
+                            continue
+                        # 已读满limit个包后又出现新的包，才说明结果被截断
+                        if limit and len(packets) >= limit:
+                            truncated = True
+                            break
+                        packets.append(orjson.loads(line))
+                        # 上一个通知尚未发出时跳过本次，下次通知会带上最新的数量
+                        if progress and len(packets) % _PROGRESS_INTERVAL == 0:
+                            if progress_task is None or progress_task.done():
+                                progress_task = asyncio.create_task(progress(len(packets), limit or None))
+                    else:
+                        finished = True
+                except BaseException:
+                    if progress_task is not None:
+                        progress_task.cancel()
+                    raise
+                finally:
+                    # 达到数量上限或解析出错时提前结束tshark
+                    if not finished and proc.returncode is None:
+                        proc.terminate()
+                    returncode = await proc.wait()
+                    stderr = (await stderr_task).decode(errors="replace")
+            
+            # 释放名额后再等待最后一个进度通知发出
+            if progress_task is not None:
+                await progress_task
             
             return {
-                "success": result.returncode == 0,
-                "stdout": result.stdout,
-                "stderr": result.stderr
+                "success": truncated or returncode == 0,
+                "packets": packets,
+                "count": len(packets),
+                "stderr": stderr,
+                "truncated": truncated
             }
-        except subprocess.SubprocessError as e:
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
             return {
                 "success": False,
                 "error": str(e)
             }
     
     @staticmethod
-    def analyze_capture(file_path: str, analysis_type: str) -> Dict[str, Any]:
-        """分析捕获文件并提供统计数据"""
-        supported_types = {
-            "conversations": "conv,ip",
-            "endpoints": "endpoints,ip",
-            "protocols": "io,phs",
-            "http": "http,tree",
-            "dns": "dns,tree"
-        }
-        
-        if analysis_type not in supported_types:
+    async def parse_with_pyshark(file_path: str, protocols: Optional[List[str]] = None, filter_str: str = None, limit: int = 100) -> Dict[str, Any]:
+        """使用pyshark (JSON模式) 解析捕获文件"""
+        try:
+            async with tshark_limiter:
+                packets = await asyncio.to_thread(
+                    _parse_with_pyshark, file_path, protocols, filter_str, limit
+                )
+            return {
+                "success": True,
+                "packets": packets,
+                "count": len(packets)
+            }
+        except ImportError:
             return {
                 "success": False,
-                "error": f"不支持的分析类型: {analysis_type}. 支持的类型: {list(supported_types.keys())}"
+                "error": "pyshark未安装，请运行 pip install pyshark"
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    @staticmethod
+    async def analyze_capture(file_path: str, analysis_type: str, max_bytes: int = _MAX_OUTPUT_BYTES) -> Dict[str, Any]:
+        """分析捕获文件并提供统计数据，结果按文件内容缓存"""
+        if analysis_type not in _ANALYSIS_TYPES:
+            return {
+                "success": False,
+                "error": f"不支持的分析类型: {analysis_type}. 支持的类型: {list(_ANALYSIS_TYPES.keys())}"
             }
         
+        key = _AnalysisCache.key(file_path, analysis_type, max_bytes)
+        if key is not None:
+            cached = _analysis_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        result = await WiresharkTools._analyze_uncached(file_path, analysis_type, max_bytes)
+        if key is not None and result["success"]:
+            _analysis_cache.put(key, result)
+        return result
+    
+    @staticmethod
+    async def _analyze_uncached(file_path: str, analysis_type: str, max_bytes: int) -> Dict[str, Any]:
+        """运行tshark分析捕获文件，大文件按分片并行分析"""
+        # 分片都经过tshark并发限制器运行，超过其名额数的分片不会带来更多并行
+        shards = min(os.cpu_count() or 1, tshark_limiter.size)
+        if analysis_type in _SHARD_MERGERS and shards > 1:
+            try:
+                if os.path.isfile(file_path) and os.path.getsize(file_path) >= _SHARD_MIN_BYTES:
+                    return await _sharded_analyze(file_path, analysis_type, shards)
+            except (subprocess.SubprocessError, OSError, ValueError) as e:
+                logger.warning(f"分片分析失败，改为单进程分析: {str(e)}")
+        
         try:
-            cmd = ["tshark", "-r", file_path, "-q", "-z", supported_types[analysis_type]]
-            
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+            # 同一文件上并发的分析请求会被合并为一次tshark运行
+            returncode, stdout, stderr, truncated = await _analyze_batcher.submit(
+                file_path, analysis_type, max_bytes
             )
             
             return {
-                "success": result.returncode == 0,
-                "stdout": result.stdout,
-                "stderr": result.stderr
+                "success": truncated or returncode == 0,
+                "stdout": stdout,
+                "stderr": stderr,
+                "truncated": truncated
             }
-        except subprocess.SubprocessError as e:
+        except (subprocess.SubprocessError, OSError) as e:
             return {
                 "success": False,
                 "error": str(e)
@@ -233,7 +755,7 @@ async def server_lifespan(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
     try:
         logger.info("Wireshark MCP服务器启动中...")
         # 验证Wireshark可用性
-        if not WiresharkTools.check_wireshark_installed():
+        if not await WiresharkTools.check_wireshark_installed():
             logger.error("Wireshark未安装或tshark命令不可用")
             raise Exception("Wireshark未安装或tshark命令不可用")
             
@@ -242,6 +764,45 @@ async def server_lifespan(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
     finally:
         logger.info("Wireshark MCP服务器关闭")
 
+class ORJSONResponse(Response):
+    """使用orjson序列化的JSON响应"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def _json_content(result: Dict[str, Any]) -> TextContent:
+    """用orjson序列化工具结果，替代FastMCP默认的json.dumps"""
+    return TextContent(type="text", text=orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS).decode())
+
+# 允许读写捕获文件的目录，相对路径基于该目录解析
+CAPTURE_DIR = Path(os.environ.get("MCP_CAPTURE_DIR", os.getcwd())).resolve()
+
+def _resolve_capture_path(file_path: str, must_exist: bool = True) -> Optional[str]:
+    """把路径解析到CAPTURE_DIR内，不在允许目录内（或要求存在但不存在）时返回None"""
+    path = (CAPTURE_DIR / file_path).resolve()
+    if not path.is_relative_to(CAPTURE_DIR):
+        return None
+    if must_exist and not path.is_file():
+        return None
+    return str(path)
+
+async def _is_valid_interface(interface: str) -> bool:
+    """检查接口是否在tshark -D列出的接口中（编号或名称均可）"""
+    for item in await WiresharkTools.get_available_interfaces():
+        # 接口描述形如 "en0 (Wi-Fi)"，也接受不带括号说明的接口名
+        name = item["interface"].split(" ", 1)[0]
+        if interface in (item["index"], item["interface"], name):
+            return True
+    return False
+
+def _invalid_path_result(file_path: str) -> Dict[str, Any]:
+    """文件路径校验失败时的返回结果"""
+    return {
+        "success": False,
+        "error": f"文件不存在或不在允许的目录 {CAPTURE_DIR} 内: {file_path}"
+    }
+
 # 创建MCP服务器
 app = FastMCP(
     "wireshark", 
@@ -249,22 +810,23 @@ app = FastMCP(
     lifespan=server_lifespan
 )
 prompt_store = WiresharkPromptStore()
+_prompts_content = TextContent(type="text", text=prompt_store.list_bytes().decode())
 
 # 注册工具
 @app.tool()
-def wireshark_check_installation() -> Dict[str, bool]:
+async def wireshark_check_installation() -> Dict[str, bool]:
     """检查Wireshark是否已安装"""
-    is_installed = WiresharkTools.check_wireshark_installed()
+    is_installed = await WiresharkTools.check_wireshark_installed()
     return {"installed": is_installed}
 
 @app.tool()
-def wireshark_get_interfaces() -> Dict[str, List[Dict[str, str]]]:
+async def wireshark_get_interfaces() -> Dict[str, List[Dict[str, str]]]:
     """获取可用的网络接口列表"""
-    interfaces = WiresharkTools.get_available_interfaces()
+    interfaces = await WiresharkTools.get_available_interfaces()
     return {"interfaces": interfaces}
 
 @app.tool()
-def wireshark_capture_packets(
+async def wireshark_capture_packets(
     interface: str,
     duration: int = 10,
     filter_str: str = None,
@@ -280,12 +842,22 @@ def wireshark_capture_packets(
     - output_file: 可选的输出文件路径
     """
     try:
-        logger.info(f"开始在接口 {interface} 上捕获数据包 (持续 {duration} 秒)")
+        if not await _is_valid_interface(interface):
+            return {
+                "success": False,
+                "error": f"无效的网络接口: {interface}"
+            }
         
         if not output_file:
             output_file = f"capture_{int(time.time())}.pcap"
+        resolved = _resolve_capture_path(output_file, must_exist=False)
+        if resolved is None:
+            return _invalid_path_result(output_file)
+        output_file = resolved
         
-        result = WiresharkTools.capture_packets(
+        logger.info(f"开始在接口 {interface} 上捕获数据包 (持续 {duration} 秒)")
+        
+        result = await WiresharkTools.capture_packets(
             interface=interface,
             duration=duration,
             filter_str=filter_str,
@@ -306,11 +878,13 @@ def wireshark_capture_packets(
         }
 
 @app.tool()
-def wireshark_read_capture(
+async def wireshark_read_capture(
     file_path: str,
     filter_str: str = None,
-    limit: int = 100
-) -> Dict[str, Any]:
+    limit: int = 100,
+    protocols: Optional[List[str]] = None,
+    ctx: Context = None
+):
     """
     读取捕获的数据包文件
     
@@ -318,20 +892,29 @@ def wireshark_read_capture(
     - file_path: 捕获文件路径
     - filter_str: 可选的显示过滤器
     - limit: 最大读取的数据包数量
+    - protocols: 可选的协议列表 (如 ["ip", "tcp", "http"])，只输出这些协议的字段；省略时输出完整解析结果
+    
+    读取过程中每解析100个数据包发送一次进度通知 (客户端需提供progressToken)
     """
-    result = WiresharkTools.read_capture_file(
-        file_path=file_path,
+    resolved = _resolve_capture_path(file_path)
+    if resolved is None:
+        return _json_content(_invalid_path_result(file_path))
+    
+    result = await WiresharkTools.read_capture_file(
+        file_path=resolved,
         filter_str=filter_str,
-        limit=limit
+        limit=limit,
+        protocols=protocols,
+        progress=ctx.report_progress if ctx else None
     )
     
-    return result
+    return _json_content(result)
 
 @app.tool()
-def wireshark_analyze(
+async def wireshark_analyze(
     file_path: str,
     analysis_type: str
-) -> Dict[str, Any]:
+):
     """
     分析捕获文件并提供统计数据
     
@@ -339,23 +922,54 @@ def wireshark_analyze(
     - file_path: 捕获文件路径
     - analysis_type: 分析类型 (conversations, endpoints, protocols, http, dns)
     """
-    result = WiresharkTools.analyze_capture(
-        file_path=file_path,
+    resolved = _resolve_capture_path(file_path)
+    if resolved is None:
+        return _json_content(_invalid_path_result(file_path))
+    
+    result = await WiresharkTools.analyze_capture(
+        file_path=resolved,
         analysis_type=analysis_type
     )
     
-    return result
+    return _json_content(result)
+
+@app.tool()
+async def wireshark_parse_pyshark(
+    file_path: str,
+    protocols: Optional[List[str]] = None,
+    filter_str: str = None,
+    limit: int = 100
+):
+    """
+    使用pyshark解析捕获文件，返回简化的数据包字段
+    
+    参数:
+    - file_path: 捕获文件路径
+    - protocols: 可选的协议列表 (如 ["ip", "tcp", "http"])，只解析这些协议
+    - filter_str: 可选的显示过滤器
+    - limit: 最大解析的数据包数量
+    """
+    resolved = _resolve_capture_path(file_path)
+    if resolved is None:
+        return _json_content(_invalid_path_result(file_path))
+    
+    result = await WiresharkTools.parse_with_pyshark(
+        file_path=resolved,
+        protocols=protocols,
+        filter_str=filter_str,
+        limit=limit
+    )
+    
+    return _json_content(result)
 
 @app.tool()
-def wireshark_get_prompts() -> Dict[str, List[Dict[str, str]]]:
+async def wireshark_get_prompts():
     """获取所有Wireshark相关提示"""
-    prompts = prompt_store.list()
-    return {
-        "prompts": prompts
-    }
+    # 直接返回预先序列化的响应，无需每次重新构建和序列化
+    return _prompts_content
 
 @app.tool()
-def wireshark_get_prompt(
+async def wireshark_get_prompt(
     prompt_id: str
 ) -> Dict[str, Any]:
     """
@@ -368,7 +982,7 @@ def wireshark_get_prompt(
     if prompt:
         return {
             "success": True,
-            "prompt": prompt
+            "prompt": dict(prompt)
         }
     else:
         return {
@@ -377,15 +991,15 @@ def wireshark_get_prompt(
         }
 
 @app.tool()
-def wireshark_health_check() -> Dict[str, Any]:
+async def wireshark_health_check() -> Dict[str, Any]:
     """
     检查Wireshark服务状态
     
     返回Wireshark安装状态和可用网络接口数量
     """
     try:
-        is_installed = WiresharkTools.check_wireshark_installed()
-        interfaces = WiresharkTools.get_available_interfaces() if is_installed else []
+        is_installed = await WiresharkTools.check_wireshark_installed()
+        interfaces = await WiresharkTools.get_available_interfaces() if is_installed else []
         
         return {
             "status": "ok" if is_installed else "error",
@@ -404,15 +1018,7 @@ def wireshark_health_check() -> Dict[str, Any]:
 @app.prompt()
 def wireshark_filter_guide() -> str:
     """提供Wireshark过滤器使用指南"""
-    return """常用Wireshark过滤器:
-- IP地址过滤: ip.addr == 192.168.1.1
-- 端口过滤: tcp.port == 80 或 udp.port == 53
-- 协议过滤: http 或 dns 或 tcp
-- HTTP请求过滤: http.request.method == "GET"
-- DNS过滤: dns.qry.name contains "example.com"
-- 数据包大小过滤: frame.len > 1000
-- 多条件组合: (ip.src == 192.168.1.1) && (tcp.port == 80)
-
+    return _FILTERS_TEXT + """
 过滤器示例用例:
 1. 查找特定主机通信: ip.addr == 10.0.0.1
 2. 查找HTTP GET请求: http.request.method == "GET"
@@ -424,14 +1030,7 @@ def wireshark_filter_guide() -> str:
 @app.prompt()
 def wireshark_analysis_guide() -> str:
     """提供Wireshark网络分析方法指南"""
-    return """网络分析基本步骤:
-1. 应用适当的过滤器缩小分析范围
-2. 查找关键连接 (SYN, SYN-ACK等TCP握手)
-3. 分析响应时间和延迟情况
-4. 检查错误包和重传包
-5. 对特定协议深入分析其字段
-6. 导出重要会话为单独文件
-
+    return _ANALYSIS_TEXT + """
 分析方法:
 - 查看统计信息: Statistics > Protocol Hierarchy / Endpoints / Conversations
 - 跟踪TCP流: 右键点击包 > Follow > TCP Stream
@@ -444,7 +1043,7 @@ def wireshark_analysis_guide() -> str:
 from mcp.server.sse import SseServerTransport
 from starlette.applications import Starlette
 from starlette.routing import Mount, Route
-from starlette.responses import JSONResponse, HTMLResponse
+from starlette.responses import HTMLResponse
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
 
@@ -476,8 +1075,8 @@ def create_sse_server(mcp_server):
     
     async def health(request):
         """提供简单的健康检查端点"""
-        is_installed = WiresharkTools.check_wireshark_installed()
-        return JSONResponse({
+        is_installed = await WiresharkTools.check_wireshark_installed()
+        return ORJSONResponse({
             "status": "healthy" if is_installed else "unhealthy",
             "wireshark_installed": is_installed,
             "server_time": time.time()
@@ -491,12 +1090,15 @@ def create_sse_server(mcp_server):
         Mount("/messages/", app=transport.handle_post_message),
     ]
 
-    # 添加CORS中间件
+    # 添加CORS中间件，允许的来源可通过MCP_CORS_ORIGINS（逗号分隔）限定，默认为*
+    cors_origins = [
+        origin.strip() for origin in os.environ.get("MCP_CORS_ORIGINS", "*").split(",") if origin.strip()
+    ]
     middleware = [
         Middleware(
             CORSMiddleware,
-            allow_origins=["*"],
-            allow_methods=["*"],
+            allow_origins=cors_origins,
+            allow_methods=["GET", "POST"],
             allow_headers=["*"],
         )
     ]
@@ -504,17 +1106,25 @@ def create_sse_server(mcp_server):
     # 创建Starlette应用
     return Starlette(routes=routes, middleware=middleware)
 
+# 模块级SSE应用，也可以通过 uvicorn wireshark_mcp_server:sse_app 启动
+sse_app = create_sse_server(app._mcp_server)
+
 if __name__ == "__main__":
     try:
         # 启动MCP服务器
         port = int(os.environ.get("MCP_PORT", 3001))
         host = os.environ.get("MCP_HOST", "127.0.0.1")
+        # SSE会话保存在进程内，/messages/请求必须回到持有/sse/连接的进程；
+        # uvicorn的多个worker共享同一个监听端口，无法按会话路由，因此不支持多worker
+        if int(os.environ.get("MCP_WORKERS", 1)) > 1:
+            logger.error("不支持MCP_WORKERS > 1: SSE会话无法在多个worker进程之间共享")
+            sys.exit(1)
         
         # 显示基本信息
         logger.info(f"启动Wireshark MCP服务器在 {host}:{port}")
-        if WiresharkTools.check_wireshark_installed():
+        if asyncio.run(WiresharkTools.check_wireshark_installed()):
             logger.info("Wireshark已安装并可用")
-            interfaces = WiresharkTools.get_available_interfaces()
+            interfaces = asyncio.run(WiresharkTools.get_available_interfaces())
             logger.info(f"检测到 {len(interfaces)} 个网络接口:")
             for interface in interfaces:
                 logger.info(f"  {interface['index']}. {interface['interface']}")
@@ -523,13 +1133,23 @@ if __name__ == "__main__":
             logger.error("请安装Wireshark并确保tshark命令可用")
             sys.exit(1)
         
-        # 使用自定义函数创建SSE服务器应用
-        sse_app = create_sse_server(app._mcp_server)
-        
         # 启动服务器
         import uvicorn
+        import importlib.util
+        # uvicorn[standard]安装了uvloop和httptools时，loop/http为"auto"会自动选用它们 (Windows上没有uvloop)
+        loop_impl = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+        logger.info(f"使用 {loop_impl} 事件循环")
         logger.info(f"服务器已就绪，可通过 http://{host}:{port}/sse/ 访问")
-        uvicorn.run(sse_app, host=host, port=port)
+        # SSE连接本身由sse_starlette每15秒发送ping保活；这里放宽空闲连接和关闭等待时间
+        uvicorn.run(
+            sse_app,
+            host=host,
+            port=port,
+            loop="auto",
+            http="auto",
+            timeout_keep_alive=75,
+            timeout_graceful_shutdown=30
+        )
     except Exception as e:
         logger.error(f"启动服务器时发生错误: {str(e)}")
         import traceback